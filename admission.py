@@ -0,0 +1,164 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+from starlette.responses import JSONResponse
+from config import settings
+
+
+
+# Routes are matched in order; the first matching (methods, path prefix) decides the class
+ROUTE_CLASSES: Tuple[Tuple[Tuple[str, ...], str, str], ...] = (
+    (("POST",), "/uploadfile/", "upload"),
+    (("POST",), "/token", "auth"),
+    (("POST",), "/registration", "auth"),
+    (("POST",), "/partner/users/bulk", "bulk"),
+    (("GET", "HEAD"), "/products", "read"),
+    (("GET", "HEAD"), "/browse", "read"),
+    (("GET", "HEAD"), "/autocomplete", "read"),
+    (("GET", "HEAD"), "/static/", "read"),
+)
+
+DEFAULT_CLASS = "default"
+
+# Per class: (initial limit, minimum limit, maximum limit, wait queue size).
+# Expensive classes (PIL resizing, bcrypt) get small limits so a burst of them
+# cannot starve cheap reads. A class whose minimum equals its maximum has a fixed
+# limit; bulk provisioning runs for minutes, so it gets one slot of its own rather
+# than holding auth slots and skewing their latency.
+CLASS_LIMITS: Dict[str, Tuple[int, int, int, int]] = {
+    "read": (64, 8, 512, 256),
+    "default": (32, 4, 256, 64),
+    "auth": (8, 2, 32, 32),
+    "upload": (4, 1, 16, 16),
+    "bulk": (1, 1, 1, 2),
+}
+
+
+
+def classify(method: str, path: str) -> str:
+    for methods, prefix, priority_class in ROUTE_CLASSES:
+        if method in methods and path.startswith(prefix):
+            return priority_class
+    return DEFAULT_CLASS
+
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit with a bounded wait queue for one priority class.
+
+    The limit adapts to observed latency: a long-term average approximates the
+    latency the class has when healthy, and when recent requests get slower than that
+    the limit shrinks in proportion, otherwise it grows by about sqrt(limit).
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int, queue_size: int):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.short_latency = 0.0
+        self.long_latency = 0.0
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a slot. Returns False if the request should be shed.
+        """
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=settings.admission_queue_timeout)
+        except asyncio.TimeoutError:
+            # A release may hand this waiter a slot in the same loop iteration the
+            # timeout fires; wait_for then discards the result (Python 3.12+), but the
+            # slot is already counted in in_flight, so keep it rather than leak it
+            if waiter.done() and not waiter.cancelled():
+                return True
+            return False
+        except asyncio.CancelledError:
+            # A slot may have been handed over just as the request was cancelled
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake_waiters()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        return True
+
+    def release(self, latency: float):
+        self.in_flight -= 1
+        self._update_limit(latency)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Hand freed slots to queued requests; the slot counts as taken on their behalf
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _update_limit(self, latency: float):
+        if self.minimum == self.maximum:
+            return
+        if self.long_latency == 0.0:
+            self.short_latency = self.long_latency = latency
+            return
+
+        self.short_latency += (latency - self.short_latency) * 0.1
+        self.long_latency += (latency - self.long_latency) * 0.01
+
+        gradient = max(0.5, min(1.0, self.long_latency / self.short_latency))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = max(self.minimum, min(self.maximum, self.limit * 0.8 + new_limit * 0.2))
+
+
+
+class AdmissionMiddleware:
+    """
+    Admission control and load shedding. Each request is assigned a priority class
+    from its route; once a class is at its concurrency limit further requests wait in
+    its bounded queue, and those that cannot be queued, or wait longer than
+    admission_queue_timeout, get an immediate 503.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiters = {
+            name: AdaptiveLimiter(name, *limits)
+            for name, limits in CLASS_LIMITS.items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        # Websockets are long lived and are not subject to request admission
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[classify(scope["method"], scope["path"])]
+        if not await limiter.acquire():
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(settings.admission_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - start)
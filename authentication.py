@@ -1,10 +1,12 @@
 import jwt
+import secrets
 from passlib.context import CryptContext
 from database import get_db
 from config import settings
 import models
 from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Header
+from typing import Optional
 
 
 
@@ -84,3 +86,17 @@ async def token_generator(username: str, password: str, db: Session):
     token = jwt.encode(token_data, settings.secret)
     return token
 
+
+
+# Check a token against the configured admin token (admin endpoints are disabled when unset)
+def is_admin_token(token: Optional[str]):
+    return bool(settings.admin_token) and token is not None and secrets.compare_digest(token, settings.admin_token)
+
+
+# Dependency guarding the admin endpoints
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to perform this action",
+        )
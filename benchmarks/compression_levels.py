@@ -0,0 +1,92 @@
+"""
+Benchmark the CPU cost of compressing a GET /products payload against the bytes saved,
+for every gzip level and brotli quality.
+
+Runs standalone (no database or .env needed) on a synthetic catalog shaped like the
+real product rows:
+
+    python benchmarks/compression_levels.py --products 20000
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+CATEGORIES = ["electronics", "groceries", "fashion", "furniture", "beauty", "toys", "sports", "books"]
+WORDS = ["fresh", "deluxe", "classic", "smart", "organic", "mini", "pro", "family", "premium", "eco"]
+
+
+def synthetic_catalog(count: int) -> bytes:
+    """
+    Build a GET /products response body with count products.
+    """
+    rng = random.Random(42)
+    today = date.today()
+    published = datetime.now(timezone.utc)
+    products = []
+    for product_id in range(1, count + 1):
+        original_price = round(rng.uniform(1, 2000), 2)
+        new_price = round(original_price * rng.uniform(0.5, 1.0), 2)
+        products.append({
+            "id": product_id,
+            "name": " ".join(rng.sample(WORDS, 3)),
+            "category": rng.choice(CATEGORIES),
+            "original_price": f"{original_price:.2f}",
+            "new_price": f"{new_price:.2f}",
+            "percentage_discount": int((original_price - new_price) / original_price * 100),
+            "offer_expiration_date": (today + timedelta(days=rng.randint(1, 60))).isoformat(),
+            "product_image": f"{rng.getrandbits(80):020x}.jpg",
+            "date_published": (published - timedelta(minutes=product_id)).isoformat(),
+            "business_id": rng.randint(1, max(1, count // 20)),
+        })
+    body = json.dumps({"status": "ok", "data": products}, ensure_ascii=False, separators=(",", ":"))
+    return body.encode("utf-8")
+
+
+def measure(compress, body: bytes, rounds: int):
+    """
+    Return (best seconds per compression, compressed size).
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        compressed = compress(body)
+        best = min(best, time.perf_counter() - start)
+    return best, len(compressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000, help="number of products in the payload")
+    parser.add_argument("--rounds", type=int, default=3, help="timed rounds per setting (best is reported)")
+    args = parser.parse_args()
+
+    body = synthetic_catalog(args.products)
+    print(f"Payload: {args.products} products, {len(body) / 1024:.0f} KiB uncompressed\n")
+    print(f"{'encoding':<10}{'level':>6}{'ms':>10}{'MiB/s':>10}{'KiB':>10}{'ratio':>8}{'saved KiB/ms':>14}")
+
+    settings = [("gzip", level, lambda b, level=level: zlib.compress(b, level, wbits=31)) for level in range(1, 10)]
+    if brotli is not None:
+        settings += [("br", quality, lambda b, quality=quality: brotli.compress(b, quality=quality)) for quality in range(0, 12)]
+    else:
+        print("(brotli not installed, skipping br)")
+
+    for encoding, level, compress in settings:
+        seconds, size = measure(compress, body, args.rounds)
+        saved_kib = (len(body) - size) / 1024
+        print(
+            f"{encoding:<10}{level:>6}{seconds * 1000:>10.1f}{len(body) / seconds / 2**20:>10.1f}"
+            f"{size / 1024:>10.0f}{len(body) / size:>8.1f}{saved_kib / (seconds * 1000):>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
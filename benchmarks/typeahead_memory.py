@@ -0,0 +1,82 @@
+"""
+Report the memory footprint and query latency of the autocomplete index
+(typeahead.TypeaheadIndex) for a synthetic set of names. No database is used, but
+config still reads its settings, so run it from the repo root next to .env:
+
+    python benchmarks/typeahead_memory.py --names 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import typeahead
+
+
+SYLLABLES = ["ka", "lo", "mi", "su", "ra", "ne", "to", "vi", "ba", "de", "fo", "gu", "pe", "zi", "ho", "ju"]
+WORDS = ["fresh", "deluxe", "classic", "smart", "organic", "mini", "pro", "family", "premium", "eco", "max", "lite"]
+
+
+def synthetic_name(rng: random.Random) -> str:
+    brand = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+    return f"{brand} {' '.join(rng.sample(WORDS, rng.randint(1, 3)))} {rng.randint(1, 999)}"
+
+
+def build(count: int) -> typeahead.TypeaheadIndex:
+    rng = random.Random(42)
+    index = typeahead.TypeaheadIndex()
+    for number in range(count):
+        name = synthetic_name(rng)
+        # Zipf-like popularity
+        weight = int(1000 / (1 + rng.paretovariate(1.2)))
+        if number % 20 == 0:
+            index.bulk_add(typeahead.BUSINESS, name, weight, str(number))
+        else:
+            index.bulk_add(typeahead.PRODUCT, name, weight)
+    index.finish_build()
+    return index
+
+
+def time_queries(index: typeahead.TypeaheadIndex, prefixes, rounds: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for prefix in prefixes:
+            index.search(prefix, 10)
+    return (time.perf_counter() - start) / (rounds * len(prefixes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=1000000, help="number of names to index")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build(args.names)
+    build_seconds = time.perf_counter() - start
+
+    # Build again under tracemalloc, which slows allocation down too much to time
+    tracemalloc.start()
+    index = build(args.names)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Indexed {len(index)} keys in {build_seconds:.1f}s")
+    print(f"Resident index size: {current / 2**20:.0f} MiB ({current / len(index):.0f} bytes/key), build peak {peak / 2**20:.0f} MiB")
+
+    rng = random.Random(7)
+    for length in (1, 2, 3, 5, 8):
+        prefixes = [typeahead.normalize(synthetic_name(rng))[:length] for _ in range(50)]
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix, 10)
+        cold = (time.perf_counter() - start) / len(prefixes)
+        warm = time_queries(index, prefixes)
+        print(f"prefix length {length}: first query {cold * 1e6:8.1f} us, warm {warm * 1e6:6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import anyio
+import json
+import stat
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
+from config import settings
+
+# Brotli is a compiled extension; fall back to gzip only if it is not installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+
+# File suffix of the precompressed sibling of a static file, per encoding
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Content types worth compressing; images and archives are already compressed
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+    "text/",
+)
+
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """
+    Encodings this server can produce, in order of preference.
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the supported encoding with the highest q-value in an Accept-Encoding
+    header, breaking ties by server preference, or None if the response should be
+    sent uncompressed.
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return content_type is not None and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compressor(encoding: str, level: Optional[int] = None):
+    """
+    Return a streaming compressor object with compress() and flush() methods.
+    The level defaults to gzip_level or brotli_quality from settings.
+    """
+    if encoding == "br":
+        return _BrotliCompressor(settings.brotli_quality if level is None else level)
+    # wbits=31 selects the gzip container
+    return zlib.compressobj(settings.gzip_level if level is None else level, zlib.DEFLATED, 31)
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    stream = compressor(encoding, level)
+    return stream.compress(body) + stream.flush()
+
+
+
+class _BrotliCompressor:
+    """
+    Adapt brotli.Compressor to the compress()/flush() interface of zlib.
+    """
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+
+class CompressedPayload:
+    """
+    A serialized response body together with its compressed variants, which are
+    computed on first request and reused afterwards.
+    """
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.body = body
+        self.media_type = media_type
+        self._encoded: Dict[str, bytes] = {}
+
+    @classmethod
+    def from_json(cls, content) -> "CompressedPayload":
+        # Same separators and options FastAPI's JSONResponse uses
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+        return cls(body.encode("utf-8"))
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+    def response(self, request: Request) -> Response:
+        """
+        Build a response in the best encoding the client accepts.
+        """
+        headers = {"Vary": "Accept-Encoding"}
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        if encoding is None or len(self.body) < settings.compression_min_size:
+            return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+        headers["Content-Encoding"] = encoding
+        return Response(content=self.encoded(encoding), media_type=self.media_type, headers=headers)
+
+
+
+class PayloadCache:
+    """
+    Small time-bounded cache of CompressedPayloads, cleared whenever the catalog changes.
+
+    Every clear() bumps the generation. Callers read the generation before querying
+    and pass it to set(), so a payload built from data that was read before a clear
+    is never stored.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: Dict[str, Tuple[float, CompressedPayload]] = {}
+
+    def get(self, key: str) -> Optional[CompressedPayload]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def set(self, key: str, payload: CompressedPayload, generation: int):
+        if generation == self.generation:
+            self._entries[key] = (time.monotonic(), payload)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves a precompressed sibling (file.br or file.gz) when one exists
+    and the client accepts that encoding, so static files are never compressed per request.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is not None and scope["method"] in ("GET", "HEAD"):
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, path + PRECOMPRESSED_SUFFIXES[encoding]
+            )
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                # The media type is guessed from the name without the .gz/.br suffix
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["Content-Encoding"] = encoding
+                response.headers.add_vary_header("Accept-Encoding")
+                return response
+        return await super().get_response(path, scope)
+
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip as negotiated from Accept-Encoding.
+
+    Responses that already carry a Content-Encoding (such as cached catalog payloads),
+    non-text content types and bodies smaller than compression_min_size are passed
+    through untouched. Streaming bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+
+class _CompressingResponder:
+
+    def __init__(self, send, encoding: str):
+        self._send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.stream = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers back until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                self.passthrough = True
+                await self._send(self.start_message)
+                self.start_message = None
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            headers = MutableHeaders(scope=self.start_message)
+            if (
+                "content-encoding" in headers
+                or not is_compressible(headers.get("content-type"))
+                or (not more_body and len(body) < settings.compression_min_size)
+            ):
+                self.passthrough = True
+                await self._send(self.start_message)
+                self.start_message = None
+                await self._send(message)
+                return
+
+            self.stream = compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                body = self.stream.compress(body)
+            else:
+                body = self.stream.compress(body) + self.stream.flush()
+                headers["Content-Length"] = str(len(body))
+            await self._send(self.start_message)
+            self.start_message = None
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        body = self.stream.compress(body)
+        if not more_body:
+            body += self.stream.flush()
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
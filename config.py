@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -11,6 +12,57 @@ class Settings(BaseSettings):
     mail_password: str
     mail_from: str  
     secret: str
+
+    # Change feed (websocket) settings
+    notify_channel: str = "catalog_events"
+    notify_reconnect_seconds: float = 5.0
+    notify_connect_timeout: int = 5
+    ws_queue_size: int = 100
+
+    # Browse settings
+    facet_refresh_seconds: float = 60.0
+    browse_page_size: int = 50
+
+    # Request profiling settings
+    profile_token: Optional[str] = None
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "profiles"
+    profile_max_files: int = 50
+
+    # Response compression settings
+    compression_min_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    catalog_cache_ttl: float = 60.0
+
+    # Admission control settings
+    admission_enabled: bool = True
+    admission_queue_timeout: float = 2.0
+    admission_retry_after: int = 1
+
+    # Static catalog snapshot settings
+    snapshot_interval_seconds: float = 60.0
+    snapshot_shard_size: int = 1000
+    snapshot_dir: str = "static/catalog"
+    snapshot_url_prefix: str = "/static/catalog"
+
+    # Token for the admin endpoints (image GC, bulk user provisioning)
+    admin_token: Optional[str] = None
+
+    # Uploaded image garbage collection settings
+    image_dir: str = "static/images"
+    image_gc_interval_seconds: float = 3600.0
+    image_gc_grace_seconds: float = 3600.0
+    image_gc_batch_size: int = 500
+    image_gc_batch_pause: float = 0.05
+
+    # Autocomplete index settings
+    typeahead_rebuild_seconds: float = 600.0
+
+    # Bulk user provisioning settings
+    bulk_provision_max_users: int = 5000
+    bulk_hash_workers: int = 8
     
 
     class Config:
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Dict, Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+import models
+
+
+
+# Advisory lock key held while product_facets is rebuilt
+FACET_REFRESH_LOCK = 270271
+
+# Browse dimensions, mapped to the product_facets column holding them
+FACET_COLUMNS = {
+    "city": models.ProductFacet.city,
+    "region": models.ProductFacet.region,
+    "category": models.ProductFacet.category,
+}
+
+
+
+def refresh_facets(db: Session):
+    """
+    Rebuild the product_facets table from the products and businesses tables.
+
+    The delete and the re-insert happen in one transaction, so readers always see
+    either the old or the new counts. When several workers run the refresh loop, only
+    the one holding the advisory lock rebuilds the table.
+    """
+    locked = db.execute(select(func.pg_try_advisory_xact_lock(FACET_REFRESH_LOCK))).scalar()
+    if not locked:
+        db.rollback()
+        return
+
+    counts = (
+        select(
+            models.Business.city,
+            models.Business.region,
+            models.Product.category,
+            func.count(models.Product.id),
+        )
+        .join(models.Business, models.Product.business_id == models.Business.id)
+        .group_by(models.Business.city, models.Business.region, models.Product.category)
+    )
+
+    db.execute(delete(models.ProductFacet))
+    db.execute(
+        insert(models.ProductFacet).from_select(
+            ["city", "region", "category", "product_count"], counts
+        )
+    )
+    db.commit()
+
+
+def facet_counts(db: Session, filters: Dict[str, Optional[str]]) -> Dict[str, Dict[str, int]]:
+    """
+    Return product counts for every value of each browse dimension.
+
+    Each dimension is counted with the filters on the other dimensions applied, so the
+    client can show how many results picking a different value would give.
+    """
+    facets = {}
+    for dimension, column in FACET_COLUMNS.items():
+        query = select(column, func.sum(models.ProductFacet.product_count)).group_by(column)
+        for other, value in filters.items():
+            if other != dimension and value is not None:
+                query = query.where(FACET_COLUMNS[other] == value)
+        facets[dimension] = {value: int(count) for value, count in db.execute(query)}
+    return facets
+
+
+async def refresh_facets_periodically():
+    """
+    Background loop that keeps product_facets within facet_refresh_seconds of the catalog.
+    """
+    while True:
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(refresh_facets, db)
+        except Exception as e:
+            print(f"Facet refresh failed: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(settings.facet_refresh_seconds)
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Set
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+import models
+
+
+
+# Advisory lock key held during a garbage collection run
+IMAGE_GC_LOCK = 270273
+
+# Column defaults shared by every business and product; never deleted
+PROTECTED_IMAGES = {"default.jpg", "productDefault.jpg"}
+
+
+
+def referenced_images(db: Session) -> Set[str]:
+    """
+    Reference index: every image filename currently used as a Business.logo or
+    Product.product_image.
+    """
+    logos = db.execute(select(models.Business.logo).distinct()).scalars()
+    product_images = db.execute(select(models.Product.product_image).distinct()).scalars()
+    return set(logos) | set(product_images) | PROTECTED_IMAGES
+
+
+def collect_garbage(db: Session) -> dict:
+    """
+    Delete uploaded images that no business or product references any more.
+
+    A file is deleted once it has been seen unreferenced for image_gc_grace_seconds,
+    so cached catalog payloads, websocket clients and older snapshot shards that still
+    point at a replaced image keep working for that long. It must also be older than
+    the grace period, so an upload that has been written to disk but not yet committed
+    to the database is never collected. Files are deleted in batches of
+    image_gc_batch_size.
+
+    Returns a report of what was scanned and reclaimed.
+    """
+    report = {"scanned": 0, "referenced": 0, "deleted": 0, "reclaimed_bytes": 0}
+    locked = db.execute(select(func.pg_try_advisory_xact_lock(IMAGE_GC_LOCK))).scalar()
+    if not locked:
+        return report
+
+    # Take the cutoff before reading references, so every file old enough to be
+    # collected was already committed when the reference index was read
+    cutoff = time.time() - settings.image_gc_grace_seconds
+    now = datetime.now(timezone.utc)
+    live = referenced_images(db)
+    report["referenced"] = len(live)
+
+    unreferenced = {}
+    with os.scandir(settings.image_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            report["scanned"] += 1
+            if entry.name not in live:
+                unreferenced[entry.name] = (entry.path, entry.stat())
+
+    # Forget files that are referenced again or gone, and start the clock on new ones
+    first_seen = dict(db.execute(select(models.UnreferencedImage.filename, models.UnreferencedImage.first_seen)).all())
+    forgotten = [name for name in first_seen if name not in unreferenced]
+    if forgotten:
+        db.execute(delete(models.UnreferencedImage).where(models.UnreferencedImage.filename.in_(forgotten)))
+    new_names = [name for name in unreferenced if name not in first_seen]
+    if new_names:
+        db.execute(insert(models.UnreferencedImage), [{"filename": name, "first_seen": now} for name in new_names])
+
+    expired = now - timedelta(seconds=settings.image_gc_grace_seconds)
+    candidates = [
+        (name, path, stat_result.st_size)
+        for name, (path, stat_result) in unreferenced.items()
+        if name in first_seen and first_seen[name] <= expired and stat_result.st_mtime < cutoff
+    ]
+
+    for start in range(0, len(candidates), settings.image_gc_batch_size):
+        deleted = []
+        for name, path, size in candidates[start:start + settings.image_gc_batch_size]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            else:
+                report["deleted"] += 1
+                report["reclaimed_bytes"] += size
+            deleted.append(name)
+        db.execute(delete(models.UnreferencedImage).where(models.UnreferencedImage.filename.in_(deleted)))
+        # Yield between batches so a large backlog does not monopolize the disk
+        time.sleep(settings.image_gc_batch_pause)
+
+    db.commit()
+    return report
+
+
+async def collect_garbage_periodically():
+    """
+    Background loop that runs the image garbage collector every image_gc_interval_seconds.
+    """
+    while True:
+        db = SessionLocal()
+        try:
+            report = await asyncio.to_thread(collect_garbage, db)
+            if report["deleted"]:
+                print(f"Image GC deleted {report['deleted']} files, reclaimed {report['reclaimed_bytes']} bytes")
+        except Exception as e:
+            print(f"Image GC failed: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(settings.image_gc_interval_seconds)
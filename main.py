@@ -1,21 +1,31 @@
-from fastapi import FastAPI, Depends, Request, HTTPException, status, BackgroundTasks, File, UploadFile
+from fastapi import FastAPI, Depends, Request, HTTPException, status, BackgroundTasks, File, UploadFile, WebSocket, WebSocketDisconnect, Query
 import os
+import asyncio
 import jwt
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, FileResponse
 import models, schemas, authentication
 from database import engine, get_db
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy.event import listens_for
 from authentication import token_generator, authenticate_user, verify_token
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from config import settings
 import emails
 import secrets
-from fastapi.staticfiles import StaticFiles
 from PIL import Image
 from fastapi.encoders import jsonable_encoder
+from typing import Optional
+import realtime
+import facets
+import profiling
+import compression
+import admission
+import snapshots
+import typeahead
+import image_gc
+import provisioning
+from sqlalchemy.exc import IntegrityError
 
 
 
@@ -28,7 +38,7 @@ models.Base.metadata.create_all(bind=engine)
 # --- FastAPI App Setup ---
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", compression.PrecompressedStaticFiles(directory="static"), name="static")
 
 # --- CORS Middleware ---
 origins = ["*"]
@@ -40,6 +50,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Compression Middleware ---
+app.add_middleware(compression.CompressionMiddleware)
+
+# Serialized and compressed catalog responses, cleared on every catalog change event
+catalog_cache = compression.PayloadCache(ttl=settings.catalog_cache_ttl)
+realtime.broadcaster.add_listener(lambda event: catalog_cache.clear())
+
+# Keep the autocomplete index in step with product and business writes on every worker,
+# rebuilding it from the database whenever the change feed (re)connects
+realtime.broadcaster.add_listener(typeahead.index.apply_event)
+realtime.broadcaster.add_connect_listener(typeahead.index.schedule_rebuild)
+
+# --- Profiling Middleware ---
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# --- Admission Control Middleware ---
+# Added last so it runs first and sheds load before any other work is done
+app.add_middleware(admission.AdmissionMiddleware)
+
 
 # authorization configs
 oath2_scheme = OAuth2PasswordBearer(tokenUrl = 'token')
@@ -65,33 +94,59 @@ async def get_current_user(token: str = Depends(oath2_scheme), db: Session = Dep
     return user
 
 
+@app.on_event("startup")
+async def startup():
+    """
+    Start listening for catalog change events and the periodic catalog jobs.
+    The autocomplete index is built once LISTEN is established, so no write is missed.
+    """
+    await realtime.broadcaster.start()
+    app.state.typeahead_rebuilder = asyncio.create_task(typeahead.index.rebuild_periodically())
+    app.state.facet_refresher = asyncio.create_task(facets.refresh_facets_periodically())
+    app.state.snapshot_publisher = asyncio.create_task(snapshots.publish_snapshots_periodically())
+    app.state.image_collector = asyncio.create_task(image_gc.collect_garbage_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await realtime.broadcaster.stop()
+    app.state.typeahead_rebuilder.cancel()
+    app.state.facet_refresher.cancel()
+    app.state.snapshot_publisher.cancel()
+    app.state.image_collector.cancel()
+
+
 @app.get("/")
 def index():
     """Simple health check endpoint."""
     return {"message": "Hello World"}
 
 
-# Automatically create a Business for each new User registration
-# Listen for new User inserts and trigger business creation automatically
-@listens_for(models.User, "after_insert")
-def create_business(mapper, connection, target):
+@app.get("/admin/profiles", dependencies=[Depends(profiling.require_profile_token)])
+async def list_profiles():
     """
-    Automatically create a Business for each new User registration.
+    List captured request profiles, newest first.
     """
-    # Create a new database session using the current transaction connection
-    db = Session(bind=connection)  
-    
-    # Instantiate a new Business linked to the registered User
-    business_obj = models.Business(business_name=target.username, owner_id=target.id)
-    
-    # Add the new Business instance to the session
-    db.add(business_obj)  
-    
-    # Commit the transaction to save the new Business in the database
-    db.commit()  
-    
-    # Close the session to free up resources and avoid connection leaks
-    db.close()  
+    return {"status": "ok", "data": profiling.list_profiles()}
+
+
+@app.get("/admin/profiles/{name}", dependencies=[Depends(profiling.require_profile_token)])
+async def download_profile(name: str):
+    """
+    Download a captured profile in collapsed-stack format.
+    """
+    if name not in profiling.list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(settings.profile_dir, name), media_type="text/plain", filename=name)
+
+
+@app.post("/admin/images/gc", dependencies=[Depends(authentication.require_admin)])
+async def run_image_gc(db: Session = Depends(get_db)):
+    """
+    Run the uploaded image garbage collector now and report what it reclaimed.
+    """
+    report = await asyncio.to_thread(image_gc.collect_garbage, db)
+    return {"status": "ok", "data": report}
 
 
 @app.post("/registration")
@@ -101,16 +156,15 @@ async def user_registration(
     db: Session = Depends(get_db)
 ):
     """
-    Register a new user, hash their password, save to DB, and send a confirmation email.
+    Register a new user together with their business in one transaction,
+    and send a confirmation email.
     """
-    # Hash password
-    hashed_password = authentication.hash_password(user.password)
-    user.password = hashed_password
+    # Password hashing and both inserts happen in provisioning.create_users
+    [(new_user, business)] = provisioning.create_users(db, [user.dict()])
 
-    new_user = models.User(**user.dict())
-    db.add(new_user)
+    # Detach the user so its loaded attributes survive the commit for the email task
+    db.expunge(new_user)
     db.commit()
-    db.refresh(new_user)
 
     # Schedule the email to be sent in the background
    
@@ -123,6 +177,49 @@ async def user_registration(
 
 
 
+@app.post("/partner/users/bulk", dependencies=[Depends(authentication.require_admin)])
+async def bulk_user_provisioning(
+    request: schemas.BulkUserCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Create many users, each with their business, in one transaction using multi-row inserts.
+    Either every user is created or, on a duplicate username or email, none are.
+    """
+    if len(request.users) > settings.bulk_provision_max_users:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.bulk_provision_max_users} users per request"
+        )
+
+    try:
+        created = await asyncio.to_thread(provisioning.create_users, db, [user.dict() for user in request.users])
+        # Detach the new rows so their loaded attributes survive the commit
+        for new_user, business in created:
+            db.expunge(new_user)
+            db.expunge(business)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username or email already registered"
+        )
+
+    if request.send_verification_emails:
+        for new_user, business in created:
+            background_tasks.add_task(emails.send_email, emails.EmailSchema(email=[new_user.email]), new_user)
+
+    return {
+        "status": "ok",
+        "data": [
+            {"id": new_user.id, "username": new_user.username, "business_id": business.id}
+            for new_user, business in created
+        ]
+    }
+
+
 @app.get("/verification", response_class=HTMLResponse)
 async def email_verification(request: Request, token: str, db: Session = Depends(get_db)):
     """
@@ -216,6 +313,7 @@ async def create_upload_file(
     
     if owner is not None:
         business.logo = token_name
+        realtime.publish(db, realtime.business_event("update", business, {"logo": token_name}))
 
         db.add(business)      # Optional, but safe if business was queried in this session
         db.commit()           # Commit the change to the database
@@ -270,6 +368,7 @@ async def create_upload_file(
 
     if owner is not None:
         product.product_image = token_name
+        realtime.publish(db, realtime.product_event("update", product, {"product_image": token_name}))
 
         db.add(product)      # Optional, but safe if product was queried in this session
         db.commit()           # Commit the change to the database
@@ -312,18 +411,67 @@ async def add_new_product(
 
     new_product = models.Product(**product_data, business_id=business.id)
     db.add(new_product)
+    db.flush()
+    realtime.publish(db, realtime.product_event("create", new_product))
     db.commit()
     db.refresh(new_product)
     return {"status": "ok", "data": jsonable_encoder(new_product)}
 
 
 @app.get("/products")
-async def get_products(db: Session = Depends(get_db)):
+async def get_products(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all products.
+    The serialized and compressed response is cached until the catalog changes.
+    """
+    payload = catalog_cache.get("products")
+    if payload is None:
+        generation = catalog_cache.generation
+        products = db.query(models.Product).all()
+        payload = compression.CompressedPayload.from_json(
+            {"status": "ok", "data": [jsonable_encoder(product) for product in products]}
+        )
+        catalog_cache.set("products", payload, generation)
+    return payload.response(request)
+
+
+@app.get("/browse")
+async def browse_products(
+    city: Optional[str] = None,
+    region: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = Query(settings.browse_page_size, ge=1, le=settings.browse_page_size),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
     """
-    products = db.query(models.Product).all()
-    return {"status": "ok", "data": [jsonable_encoder(product) for product in products]}
+    Browse products by their business's city and region and by category,
+    with facet counts for each dimension.
+    """
+    query = db.query(models.Product).join(models.Business, models.Product.business_id == models.Business.id)
+    if city is not None:
+        query = query.filter(models.Business.city == city)
+    if region is not None:
+        query = query.filter(models.Business.region == region)
+    if category is not None:
+        query = query.filter(models.Product.category == category)
+
+    products = query.order_by(models.Product.id).offset(offset).limit(limit).all()
+    facet_data = facets.facet_counts(db, {"city": city, "region": region, "category": category})
+    return {
+        "status": "ok",
+        "data": [jsonable_encoder(product) for product in products],
+        "facets": facet_data
+    }
+
+
+@app.get("/autocomplete")
+async def autocomplete(prefix: str, limit: int = Query(10, ge=1, le=typeahead.CACHE_SIZE)):
+    """
+    Suggest product names, categories and business names starting with prefix,
+    served from the in-memory typeahead index.
+    """
+    return {"status": "ok", "data": typeahead.index.search(prefix, limit)}
 
 
 @app.get("/products/{id}")
@@ -370,6 +518,7 @@ async def delete_product(
     business = db.query(models.Business).filter(models.Business.id == product.business_id).first()
     owner = db.query(models.User).filter(models.User.id == business.owner_id).first()
     if user.id == owner.id:
+        realtime.publish(db, realtime.product_event("delete", product))
         db.delete(product)
         db.commit()
         return {"status": "ok"}
@@ -417,8 +566,13 @@ async def update_product(
         else:
             update_data["percentage_discount"] = 0
 
+    old_values = {key: getattr(db_product, key) for key in update_data}
     for key, value in update_data.items():
         setattr(db_product, key, value)
+
+    changes = realtime.product_diff(db_product, old_values)
+    if changes:
+        realtime.publish(db, realtime.product_event("update", db_product, changes, old_values))
     
     db.add(db_product)
     db.commit()
@@ -449,10 +603,56 @@ async def update_business(
             detail="Not authorized to update this business"
         )
 
-    for key, value in business.dict(exclude_unset=True).items():
+    update_data = business.dict(exclude_unset=True)
+    old_values = {key: getattr(db_business, key) for key in update_data}
+    for key, value in update_data.items():
         setattr(db_business, key, value)
 
+    changes = {key: value for key, value in update_data.items() if old_values[key] != value}
+    if changes:
+        realtime.publish(db, realtime.business_event("update", db_business, changes))
+
     db.add(db_business)
     db.commit()
     db.refresh(db_business)
-    return {"status": "ok", "data": db_business}
\ No newline at end of file
+    return {"status": "ok", "data": db_business}
+
+
+
+
+@app.websocket("/ws/products")
+async def product_updates(
+    websocket: WebSocket,
+    business_id: Optional[int] = None,
+    category: Optional[str] = None
+):
+    """
+    Stream product and business change events to the client.
+    Subscribe to one business with ?business_id=, one category with ?category=,
+    or to the whole catalog by passing neither.
+    """
+    if business_id is not None:
+        topic = realtime.business_topic(business_id)
+    elif category is not None:
+        topic = realtime.category_topic(category)
+    else:
+        topic = realtime.CATALOG_TOPIC
+
+    await websocket.accept()
+    subscriber = realtime.broadcaster.subscribe(topic)
+
+    async def forward_events():
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_text(message)
+
+    sender = asyncio.create_task(forward_events())
+    try:
+        # The feed is one way; reading only serves to notice the client going away
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        realtime.broadcaster.unsubscribe(subscriber)
@@ -1,4 +1,4 @@
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Boolean, DateTime, Text, Numeric, Date
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Boolean, DateTime, Text, Numeric, Date, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timezone, timedelta
@@ -29,13 +29,17 @@ class User(Base):
 
 class Business(Base):
     __tablename__ = 'businesses'
+    __table_args__ = (
+        # Composite index for browsing by location
+        Index("ix_businesses_region_city", "region", "city"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     business_name = Column(String(50), nullable=False, index=True)
     city = Column(String(100), nullable=False, server_default="Unspecified")
     region = Column(String(100), nullable=False, server_default="Unspecified")
     business_description = Column(Text, nullable=True)
-    logo = Column(String(255), nullable=False, default="default.jpg")  # Path or URL to the logo
+    logo = Column(String(255), nullable=False, default="default.jpg", index=True)  # Path or URL to the logo
     owner_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False, index=True)
 
     # Relationship to the User table
@@ -55,6 +59,10 @@ class Business(Base):
 
 class Product(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Composite index for browsing a location's businesses by category
+        Index("ix_products_business_id_category", "business_id", "category"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     name = Column(String(100), nullable=False, index=True)
@@ -63,7 +71,7 @@ class Product(Base):
     new_price = Column(Numeric(12, 2))
     percentage_discount = Column(Integer)
     offer_expiration_date = Column(Date, nullable=True)
-    product_image = Column(String(255), nullable=False, default="productDefault.jpg")  # Path or URL to the product image
+    product_image = Column(String(255), nullable=False, default="productDefault.jpg", index=True)  # Path or URL to the product image
     date_published = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     business_id = Column(Integer, ForeignKey('businesses.id', ondelete="CASCADE"), nullable=False, index=True)
 
@@ -76,6 +84,24 @@ class Product(Base):
 
 
 
+class ProductFacet(Base):
+    """
+    Precomputed product counts per (city, region, category), refreshed periodically
+    so facet queries never scan the products table.
+    """
+    __tablename__ = 'product_facets'
+
+    city = Column(String(100), primary_key=True)
+    region = Column(String(100), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ProductFacet(city='{self.city}', region='{self.region}', category='{self.category}', product_count={self.product_count})>"
+
+
+
+
 
 
 # @property
@@ -83,3 +109,19 @@ class Product(Base):
 #     if self.original_price and self.new_price:
 #         return round(((self.original_price - self.new_price) / self.original_price) * 100, 2)
 #     return None
+
+
+
+
+class UnreferencedImage(Base):
+    """
+    When the image garbage collector first saw an uploaded file with no references.
+    A file is only deleted once it has stayed unreferenced for the grace period.
+    """
+    __tablename__ = 'unreferenced_images'
+
+    filename = Column(String(255), primary_key=True)
+    first_seen = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<UnreferencedImage(filename='{self.filename}', first_seen={self.first_seen})>"
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+from fastapi import Header, HTTPException, status
+from config import settings
+
+
+
+# Header an admin sends to have a single request profiled
+PROFILE_HEADER = b"x-profile-token"
+
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the call stack of one thread at a fixed interval.
+
+    Async endpoints run on the event loop thread, and so do the blocking calls they
+    make (SQLAlchemy queries, PIL resizing, bcrypt hashing), so sampling that thread
+    covers all of them.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def collapse_stack(frame) -> str:
+    """
+    Render a frame and its callers as a root-first, semicolon separated stack.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def profile_filename(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{int(time.time())}-{method.lower()}-{slug}-{secrets.token_hex(4)}.collapsed"
+
+
+def store_profile(filename: str, stacks: Counter):
+    """
+    Write a profile in collapsed-stack format (readable by speedscope and flamegraph.pl)
+    and delete the oldest profiles beyond profile_max_files.
+    """
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    with open(os.path.join(settings.profile_dir, filename), "w") as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+    profiles = list_profiles()
+    for name in profiles[settings.profile_max_files:]:
+        os.remove(os.path.join(settings.profile_dir, name))
+
+
+def list_profiles() -> List[str]:
+    """
+    Return stored profile filenames, newest first.
+    """
+    if not os.path.isdir(settings.profile_dir):
+        return []
+    names = [name for name in os.listdir(settings.profile_dir) if name.endswith(".collapsed")]
+    return sorted(names, key=lambda name: os.path.getmtime(os.path.join(settings.profile_dir, name)), reverse=True)
+
+
+def is_profile_token(token: Optional[str]) -> bool:
+    return bool(settings.profile_token) and token is not None and secrets.compare_digest(token, settings.profile_token)
+
+
+async def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    """
+    Dependency guarding the profile admin endpoints.
+    """
+    if not is_profile_token(x_profile_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access profiles"
+        )
+
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiler. A request is profiled when it carries a valid
+    X-Profile-Token header, or at random with probability profile_sample_rate.
+
+    The result is a profile of the event loop thread for the request's time window,
+    not of the request alone: other requests running concurrently on the loop show
+    up in it too. Only one window is captured at a time to keep the overhead bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = False
+
+    def should_profile(self, scope) -> bool:
+        if self.active:
+            return False
+        token = dict(scope["headers"]).get(PROFILE_HEADER)
+        if token is not None and is_profile_token(token.decode("latin-1")):
+            return True
+        return random.random() < settings.profile_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.active = True
+        sampler = StackSampler(threading.get_ident(), settings.profile_interval_ms / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            self.active = False
+            if sampler.stacks:
+                filename = profile_filename(scope["method"], scope["path"])
+                await asyncio.to_thread(store_profile, filename, sampler.stacks)
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from config import settings
+import authentication
+import models
+import realtime
+
+
+
+# Business columns a caller may set when provisioning a user
+BUSINESS_FIELDS = ("business_name", "city", "region", "business_description")
+
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash passwords in a thread pool; bcrypt releases the GIL, so hashes run in parallel.
+    """
+    if len(passwords) == 1:
+        return [authentication.hash_password(passwords[0])]
+    with ThreadPoolExecutor(max_workers=settings.bulk_hash_workers) as executor:
+        return list(executor.map(authentication.hash_password, passwords))
+
+
+def create_users(db: Session, users: List[dict]) -> List[Tuple[models.User, models.Business]]:
+    """
+    Create users and their businesses inside the caller's transaction.
+
+    Each table gets one multi-row INSERT ... RETURNING (split into pages by SQLAlchemy
+    for very large batches), so generated ids and server defaults come back without a
+    refresh. Each user dict holds the UserCreate fields plus any of BUSINESS_FIELDS;
+    the business name defaults to the username. The caller commits.
+    """
+    # An empty executemany would run a single-row INSERT of column defaults
+    if not users:
+        return []
+    passwords = hash_passwords([user["password"] for user in users])
+    user_rows = [
+        {"username": user["username"], "email": user["email"], "password": password}
+        for user, password in zip(users, passwords)
+    ]
+    new_users = db.scalars(
+        insert(models.User).returning(models.User, sort_by_parameter_order=True),
+        user_rows,
+    ).all()
+
+    business_rows = []
+    for user, new_user in zip(users, new_users):
+        row = {key: user[key] for key in BUSINESS_FIELDS if user.get(key) is not None}
+        row.setdefault("business_name", new_user.username)
+        row["owner_id"] = new_user.id
+        business_rows.append(row)
+    new_businesses = db.scalars(
+        insert(models.Business).returning(models.Business, sort_by_parameter_order=True),
+        business_rows,
+    ).all()
+
+    realtime.publish_many(db, [realtime.business_event("create", business) for business in new_businesses])
+    return list(zip(new_users, new_businesses))
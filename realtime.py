@@ -0,0 +1,321 @@
+import asyncio
+import json
+import psycopg2
+import psycopg2.extensions
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Dict, List, Optional, Set
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Integer, Numeric, text
+from sqlalchemy.orm import Session
+from config import settings
+from database import SQLALCHEMY_DATABASE_URL
+
+
+
+# Topic every client subscribed to the whole catalog listens on
+CATALOG_TOPIC = "catalog"
+
+# Event sent to a client whose queue overflowed; the client should refetch what it shows
+RESYNC_EVENT = json.dumps({"op": "resync"})
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7999
+
+# Unbounded text columns; events only say that they changed and clients refetch them
+FREE_TEXT_FIELDS = ("business_description",)
+
+# Bounded identifying fields kept when an event has to be cut down to fit a payload
+IDENTITY_FIELDS = ("op", "entity", "id", "business_id", "name", "category", "old_name", "old_category")
+
+
+
+def business_topic(business_id: int) -> str:
+    return f"business:{business_id}"
+
+
+def category_topic(category: str) -> str:
+    return f"category:{category}"
+
+
+def column_value(column, value):
+    """
+    Convert a value to what the column will store, so a float from a request body
+    compares equal to the Decimal or int loaded from the database.
+    """
+    if value is None:
+        return None
+    if isinstance(column.type, Integer):
+        return int(Decimal(str(value)).quantize(Decimal(1), ROUND_HALF_UP))
+    if isinstance(column.type, Numeric) and column.type.scale is not None:
+        return Decimal(str(value)).quantize(Decimal(1).scaleb(-column.type.scale), ROUND_HALF_UP)
+    return value
+
+
+def product_diff(product, old_values: dict) -> dict:
+    """
+    Return the product columns whose value differs from the snapshot in old_values.
+    """
+    columns = product.__table__.columns
+    return {
+        key: getattr(product, key)
+        for key, old in old_values.items()
+        if column_value(columns[key], getattr(product, key)) != column_value(columns[key], old)
+    }
+
+
+def row_data(instance) -> dict:
+    return {
+        column.name: getattr(instance, column.name)
+        for column in instance.__table__.columns
+        if column.name not in FREE_TEXT_FIELDS
+    }
+
+
+def compact_changes(event: dict, changes: dict) -> dict:
+    """
+    Strip free-text fields from changes, listing them under "omitted" on the event.
+    """
+    omitted = [key for key in FREE_TEXT_FIELDS if key in changes]
+    if omitted:
+        event["omitted"] = omitted
+    return {key: value for key, value in changes.items() if key not in FREE_TEXT_FIELDS}
+
+
+def product_event(op: str, product, changes: Optional[dict] = None, old_values: Optional[dict] = None) -> dict:
+    """
+    Build a compact product event. Creates carry the full row, updates only the changed
+    columns (plus the previous name and category if those changed) and deletes only
+    the identifiers.
+    """
+    event = {
+        "op": op,
+        "entity": "product",
+        "id": product.id,
+        "business_id": product.business_id,
+        "name": product.name,
+        "category": product.category,
+    }
+    if op == "create":
+        event["data"] = row_data(product)
+    elif op == "update":
+        event["changes"] = compact_changes(event, changes or {})
+        for key in ("name", "category"):
+            if old_values and key in old_values and old_values[key] != getattr(product, key):
+                event[f"old_{key}"] = old_values[key]
+    return event
+
+
+def business_event(op: str, business, changes: Optional[dict] = None) -> dict:
+    """
+    Build a compact business event. Creates carry the full row, updates only the
+    changed columns; free-text columns are left out of both.
+    """
+    event = {"op": op, "entity": "business", "id": business.id}
+    if op == "create":
+        event["data"] = row_data(business)
+    else:
+        event["changes"] = compact_changes(event, changes or {})
+    return event
+
+
+def encode_event(event: dict) -> str:
+    """
+    Serialize an event for pg_notify. An event too large for a notification is cut
+    down to its identifying fields and marked truncated, so clients refetch it; the
+    change feed must never make the write it describes fail.
+    """
+    payload = json.dumps(jsonable_encoder(event), separators=(",", ":"))
+    if len(payload.encode()) <= MAX_PAYLOAD_BYTES:
+        return payload
+    event = {key: event[key] for key in IDENTITY_FIELDS if key in event}
+    event["truncated"] = True
+    return json.dumps(jsonable_encoder(event), separators=(",", ":"))
+
+
+def publish(db: Session, event: dict):
+    """
+    Queue an event on the session's transaction with pg_notify.
+
+    Postgres only delivers the notification once the transaction commits, so a rolled
+    back write never reaches subscribers, and every worker (including this one) receives
+    it through its LISTEN connection.
+    """
+    publish_many(db, [event])
+
+
+def publish_many(db: Session, events: List[dict]):
+    """
+    Queue several events with a single pg_notify statement.
+    """
+    if not events:
+        return
+    payloads = [encode_event(event) for event in events]
+    db.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {"channel": settings.notify_channel, "payloads": payloads},
+    )
+
+
+def event_topics(event: dict) -> Set[str]:
+    """
+    Work out which subscription topics an event should be delivered to.
+    """
+    topics = {CATALOG_TOPIC}
+    if event.get("entity") == "business":
+        topics.add(business_topic(event["id"]))
+        return topics
+
+    topics.add(business_topic(event["business_id"]))
+    topics.add(category_topic(event["category"]))
+    if event.get("old_category"):
+        topics.add(category_topic(event["old_category"]))
+    return topics
+
+
+
+class Subscriber:
+    """
+    A connected websocket client with its own bounded outgoing queue.
+    """
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_queue_size)
+
+    def offer(self, message: str):
+        """
+        Enqueue a message without blocking the broadcaster. A client that cannot keep up
+        has its backlog dropped and replaced by a single resync event.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+
+
+class Broadcaster:
+    """
+    In-process fan-out of change events to websocket subscribers, fed by Postgres
+    LISTEN/NOTIFY so that events written by any worker reach clients on every worker.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.listeners: List[Callable[[dict], None]] = []
+        self.connect_listeners: List[Callable[[], None]] = []
+        self._connection = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, topic: str) -> Subscriber:
+        subscriber = Subscriber(topic)
+        self.subscribers.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        topic_subscribers = self.subscribers.get(subscriber.topic)
+        if topic_subscribers is None:
+            return
+        topic_subscribers.discard(subscriber)
+        if not topic_subscribers:
+            del self.subscribers[subscriber.topic]
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """
+        Register a callback run in-process for every change event, e.g. to invalidate caches.
+        """
+        self.listeners.append(listener)
+
+    def add_connect_listener(self, listener: Callable[[], None]):
+        """
+        Register a callback run each time LISTEN is (re)established. Events published
+        while the feed was down are lost, so in-memory state derived from the feed
+        should be resynchronized from the database here.
+        """
+        self.connect_listeners.append(listener)
+
+    def dispatch(self, payload: str):
+        """
+        Fan a raw notification payload out to every subscriber of a matching topic.
+        """
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            print(f"Dropping malformed change event: {payload!r}")
+            return
+
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Change event listener error: {e}")
+
+        for topic in event_topics(event):
+            for subscriber in self.subscribers.get(topic, ()):
+                subscriber.offer(payload)
+
+    async def start(self):
+        """
+        Start the background task that listens for change events.
+        """
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._close_connection()
+
+    async def _listen_forever(self):
+        # Reconnect with a fixed delay if the LISTEN connection drops
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change feed listener error: {e}")
+            self._close_connection()
+            await asyncio.sleep(settings.notify_reconnect_seconds)
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        # Connect off the event loop so a slow or unreachable database does not stall requests
+        self._connection = await asyncio.to_thread(
+            psycopg2.connect, SQLALCHEMY_DATABASE_URL, connect_timeout=settings.notify_connect_timeout
+        )
+        self._connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with self._connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{settings.notify_channel}"')
+
+        for listener in self.connect_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Change feed connect listener error: {e}")
+
+        # Wake up whenever the socket is readable instead of polling on a timer.
+        # Keep the fd: once the server drops the connection, fileno() raises.
+        fd = self._connection.fileno()
+        readable = asyncio.Event()
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                self._connection.poll()
+                while self._connection.notifies:
+                    notification = self._connection.notifies.pop(0)
+                    self.dispatch(notification.payload)
+        finally:
+            loop.remove_reader(fd)
+
+    def _close_connection(self):
+        if self._connection is not None and not self._connection.closed:
+            self._connection.close()
+        self._connection = None
+
+
+
+broadcaster = Broadcaster()
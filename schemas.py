@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, date
 from typing import List, Optional
 
@@ -15,6 +15,18 @@ class UserCreate(UserBase):
     password: str
 
 
+class PartnerUserCreate(UserCreate):
+    business_name: Optional[str] = None
+    city: Optional[str] = None
+    region: Optional[str] = None
+    business_description: Optional[str] = None
+
+
+class BulkUserCreate(BaseModel):
+    users: List[PartnerUserCreate] = Field(..., min_length=1)
+    send_verification_emails: bool = True
+
+
 class UserOut(BaseModel):
     id: int
     username: str
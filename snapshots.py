@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+import compression
+import models
+
+
+
+# Advisory lock key held while a snapshot is published
+SNAPSHOT_LOCK = 270272
+
+MANIFEST_NAME = "manifest.json"
+
+# Snapshot files are written once and never change, so they can be compressed hard
+SNAPSHOT_LEVELS = {"gzip": 9, "br": 11}
+
+
+
+def shard_body(products: List[dict]) -> bytes:
+    return json.dumps(products, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def category_slug(category: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", category.lower()).strip("-") or "category"
+
+
+def build_shards(products) -> Dict[str, Tuple[str, List[dict]]]:
+    """
+    Split the catalog into shards keyed by manifest section and key.
+
+    Returns {shard id: (filename prefix, products)} where the shard id is e.g.
+    "products/3", "businesses/12" or "categories/Electronics".
+    """
+    shards: Dict[str, Tuple[str, List[dict]]] = {}
+    for product in products:
+        data = jsonable_encoder(product)
+        index = product.id // settings.snapshot_shard_size
+        keys = (
+            (f"products/{index}", f"products-{index:04d}"),
+            (f"businesses/{product.business_id}", f"business-{product.business_id}"),
+            (f"categories/{product.category}", f"category-{category_slug(product.category)}"),
+        )
+        for shard_id, prefix in keys:
+            shards.setdefault(shard_id, (prefix, []))[1].append(data)
+    return shards
+
+
+def write_atomically(path: str, data: bytes):
+    """
+    Write through a temporary file and rename it into place, so readers never see
+    a partially written file.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def read_manifest() -> dict:
+    try:
+        with open(os.path.join(settings.snapshot_dir, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest_entries(manifest: dict) -> Dict[str, dict]:
+    """
+    Flatten a manifest into {shard id: entry}.
+    """
+    entries = {}
+    for section in ("products", "businesses", "categories"):
+        for key, entry in manifest.get(section, {}).items():
+            entries[f"{section}/{key}"] = entry
+    return entries
+
+
+def publish_snapshot(db: Session) -> int:
+    """
+    Materialize the catalog as sharded, precompressed JSON files plus a manifest.
+
+    Shard filenames contain a hash of their content, so only shards whose content
+    changed since the last run are written and compressed, and a published file never
+    changes under a client or CDN. The manifest is replaced last, atomically, and files
+    from the previous generation are kept until the next run so clients that fetched
+    the old manifest can still load its shards.
+
+    Returns the number of shards written.
+    """
+    locked = db.execute(select(func.pg_try_advisory_xact_lock(SNAPSHOT_LOCK))).scalar()
+    if not locked:
+        return 0
+
+    products = db.query(models.Product).order_by(models.Product.id).all()
+    shards = build_shards(products)
+
+    os.makedirs(settings.snapshot_dir, exist_ok=True)
+    previous = read_manifest()
+    previous_entries = manifest_entries(previous)
+
+    manifest = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "shard_size": settings.snapshot_shard_size,
+        "encodings": list(compression.supported_encodings()),
+        "products": {},
+        "businesses": {},
+        "categories": {},
+    }
+    written = 0
+    for shard_id, (prefix, shard_products) in shards.items():
+        body = shard_body(shard_products)
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        filename = f"{prefix}.{digest}.json"
+
+        old_entry = previous_entries.get(shard_id)
+        path = os.path.join(settings.snapshot_dir, filename)
+        if old_entry is None or old_entry["hash"] != digest or not os.path.exists(path):
+            for encoding in compression.supported_encodings():
+                compressed = compression.compress(body, encoding, SNAPSHOT_LEVELS[encoding])
+                write_atomically(path + compression.PRECOMPRESSED_SUFFIXES[encoding], compressed)
+            write_atomically(path, body)
+            written += 1
+
+        section, key = shard_id.split("/", 1)
+        manifest[section][key] = {
+            "url": f"{settings.snapshot_url_prefix}/{filename}",
+            "hash": digest,
+            "count": len(shard_products),
+            "bytes": len(body),
+        }
+
+    write_atomically(
+        os.path.join(settings.snapshot_dir, MANIFEST_NAME),
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    )
+    remove_stale_files(manifest, previous)
+    db.rollback()
+    return written
+
+
+def remove_stale_files(manifest: dict, previous: dict):
+    """
+    Delete shard files referenced by neither the current nor the previous manifest.
+    """
+    keep = {MANIFEST_NAME}
+    for entries in (manifest_entries(manifest), manifest_entries(previous)):
+        for entry in entries.values():
+            filename = entry["url"].rsplit("/", 1)[1]
+            keep.add(filename)
+            keep.update(filename + suffix for suffix in compression.PRECOMPRESSED_SUFFIXES.values())
+
+    for name in os.listdir(settings.snapshot_dir):
+        if name not in keep:
+            os.remove(os.path.join(settings.snapshot_dir, name))
+
+
+async def publish_snapshots_periodically():
+    """
+    Background loop that republishes the catalog snapshot every snapshot_interval_seconds.
+    """
+    while True:
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(publish_snapshot, db)
+        except Exception as e:
+            print(f"Catalog snapshot failed: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(settings.snapshot_interval_seconds)
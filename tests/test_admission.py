@@ -0,0 +1,72 @@
+import asyncio
+import admission
+
+
+def test_acquire_keeps_slot_handed_over_as_timeout_fires(monkeypatch):
+    async def scenario():
+        limiter = admission.AdaptiveLimiter("test", 1, 1, 1, 4)
+        assert await limiter.acquire()
+
+        # Python 3.12+ wait_for: the holder releases, handing the slot to the waiter,
+        # in the same loop iteration the timeout fires, and the result is discarded
+        async def wait_for(waiter, timeout):
+            limiter.release(0.01)
+            assert waiter.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(admission.asyncio, "wait_for", wait_for)
+        assert await limiter.acquire()
+        assert limiter.in_flight == 1
+
+        limiter.release(0.01)
+        assert limiter.in_flight == 0
+        assert not limiter.waiters
+
+    asyncio.run(scenario())
+
+
+def test_waiter_times_out_without_taking_a_slot(monkeypatch):
+    monkeypatch.setattr(admission.settings, "admission_queue_timeout", 0.01)
+
+    async def scenario():
+        limiter = admission.AdaptiveLimiter("test", 1, 1, 1, 4)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.in_flight == 1
+        assert not limiter.waiters
+
+    asyncio.run(scenario())
+
+
+def test_release_hands_slot_to_queued_request():
+    async def scenario():
+        limiter = admission.AdaptiveLimiter("test", 1, 1, 1, 4)
+        assert await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        assert await queued
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_sheds_immediately():
+    async def scenario():
+        limiter = admission.AdaptiveLimiter("test", 1, 1, 1, 0)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_bulk_provisioning_has_its_own_fixed_class():
+    assert admission.classify("POST", "/partner/users/bulk") == "bulk"
+    assert admission.classify("POST", "/token") == "auth"
+
+    limiter = admission.AdaptiveLimiter("bulk", *admission.CLASS_LIMITS["bulk"])
+    limiter.in_flight = 1
+    limiter.release(300.0)
+    assert limiter.limit == 1
+    assert limiter.long_latency == 0.0
@@ -0,0 +1,9 @@
+import compression
+
+
+def test_negotiate_prefers_highest_quality(monkeypatch):
+    monkeypatch.setattr(compression, "supported_encodings", lambda: ("br", "gzip"))
+    assert compression.negotiate("gzip;q=1.0, br;q=0.1") == "gzip"
+    assert compression.negotiate("gzip, br") == "br"
+    assert compression.negotiate("br;q=0, *;q=0.5") == "gzip"
+    assert compression.negotiate("identity") is None
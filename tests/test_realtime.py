@@ -0,0 +1,47 @@
+import json
+from decimal import Decimal
+import models
+import realtime
+
+
+def make_business(description):
+    return models.Business(
+        id=1, business_name="shop", city="Nairobi", region="Nairobi",
+        business_description=description, logo="default.jpg", owner_id=2,
+    )
+
+
+def test_business_events_leave_out_free_text():
+    business = make_business("d" * 20000)
+
+    created = realtime.business_event("create", business)
+    assert "business_description" not in created["data"]
+
+    updated = realtime.business_event("update", business, {"business_description": "d" * 20000, "city": "Mombasa"})
+    assert updated["changes"] == {"city": "Mombasa"}
+    assert updated["omitted"] == ["business_description"]
+
+
+def test_oversized_event_falls_back_to_identifiers():
+    event = {
+        "op": "update", "entity": "product", "id": 3, "business_id": 1,
+        "name": "milk", "category": "dairy", "changes": {"name": "m" * 10000},
+    }
+    payload = realtime.encode_event(event)
+    assert len(payload.encode()) <= realtime.MAX_PAYLOAD_BYTES
+    decoded = json.loads(payload)
+    assert decoded["truncated"] is True
+    assert "changes" not in decoded
+    assert realtime.event_topics(decoded) == {"catalog", "business:1", "category:dairy"}
+
+
+def test_unchanged_prices_are_not_a_change():
+    product = models.Product(
+        id=3, name="milk", category="dairy", business_id=1,
+        original_price=12.0, new_price=9.99, percentage_discount=16.75,
+    )
+    old_values = {"original_price": Decimal("12.00"), "new_price": Decimal("9.99"), "percentage_discount": 17}
+    assert realtime.product_diff(product, old_values) == {}
+
+    product.new_price, product.percentage_discount = 9.5, 20.83
+    assert realtime.product_diff(product, old_values) == {"new_price": 9.5, "percentage_discount": 20.83}
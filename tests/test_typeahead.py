@@ -0,0 +1,69 @@
+import asyncio
+import random
+import typeahead
+
+
+def build_index(rng):
+    index = typeahead.TypeaheadIndex()
+    names = ["a" + "".join(rng.choice("abc") for _ in range(rng.randint(1, 6))) for _ in range(3000)]
+    for name in names:
+        index.bulk_add(typeahead.PRODUCT, name, rng.randint(1, 50))
+    for business_id in range(50):
+        index.business_keys[business_id] = index.bulk_add(
+            typeahead.BUSINESS, f"ab shop {business_id}", rng.randint(0, 5), str(business_id)
+        )
+    index.finish_build()
+    return index, names
+
+
+def expected_weights(index, prefix, limit):
+    weights = [weight for key, (_, weight) in index.entries.items() if key.startswith(prefix)]
+    return sorted(weights, reverse=True)[:limit]
+
+
+def test_build_caches_every_large_prefix():
+    index, _ = build_index(random.Random(0))
+    for prefix in ("a", "aa", "ab", "abc"):
+        low, high = index._range(prefix)
+        if high - low > typeahead.SCAN_LIMIT:
+            assert prefix in index.top_cache
+
+
+def test_search_matches_brute_force_under_updates():
+    rng = random.Random(1)
+    index, names = build_index(rng)
+    for step in range(5000):
+        name = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.4:
+            index.adjust(typeahead.PRODUCT, name, rng.randint(1, 5))
+        elif roll < 0.8:
+            index.adjust(typeahead.PRODUCT, name, -rng.randint(1, 5))
+        elif roll < 0.9:
+            index.apply_event({"op": "update", "entity": "business", "id": rng.randrange(50),
+                               "changes": {"business_name": name}})
+        else:
+            index.adjust_business(rng.randrange(50), rng.choice([-1, 1]))
+
+        if step % 100 == 0:
+            for prefix in ("a", "aa", "ab", "aba", "abc"):
+                found = [suggestion["weight"] for suggestion in index.search(prefix, 10)]
+                assert found == expected_weights(index, prefix, 10)
+
+    assert index.keys == sorted(index.keys)
+
+
+def test_rebuild_replays_events_received_while_building(monkeypatch):
+    live = typeahead.LiveIndex()
+
+    def from_database(db):
+        # A product is created while the build query runs
+        live.apply_event({"op": "create", "entity": "product", "id": 1, "business_id": 1,
+                          "name": "Mango Juice", "category": "drinks"})
+        return typeahead.TypeaheadIndex()
+
+    monkeypatch.setattr(typeahead.TypeaheadIndex, "from_database", staticmethod(from_database))
+    monkeypatch.setattr(typeahead, "SessionLocal", lambda: type("Session", (), {"close": lambda self: None})())
+
+    asyncio.run(live.rebuild())
+    assert [suggestion["text"] for suggestion in live.search("man")] == ["Mango Juice"]
@@ -0,0 +1,318 @@
+import asyncio
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+import models
+
+
+
+# Suggestion kinds, also used in the index keys
+PRODUCT = "product"
+CATEGORY = "category"
+BUSINESS = "business"
+
+# Separates the parts of an index key; sorts before every printable character,
+# so all keys starting with a prefix stay contiguous
+SEPARATOR = "\x00"
+
+# Prefixes matching more keys than this have their top results cached when the
+# index is built, so a query never scans more than this many keys
+SCAN_LIMIT = 256
+
+# Number of top results cached per prefix
+CACHE_SIZE = 32
+
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+
+class TypeaheadIndex:
+    """
+    In-memory prefix index over product names, categories and business names.
+
+    Keys are "<normalized text>\\0<kind>\\0<ident>" kept in one sorted list, so all
+    keys with a given prefix form a contiguous range found with two binary searches.
+    Product names and categories are aggregated across products and weighted by how
+    many products use them; businesses are weighted by their number of products.
+    Top results for every prefix matching more than SCAN_LIMIT keys are cached at
+    build time and kept up to date as weights change, so no query scans a large range.
+    """
+
+    def __init__(self):
+        self.keys: List[str] = []
+        # key -> [display text, weight]
+        self.entries: Dict[str, list] = {}
+        self.business_keys: Dict[int, str] = {}
+        self.top_cache: Dict[str, List[str]] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    # -------------------- Building --------------------
+    @classmethod
+    def from_database(cls, db: Session) -> "TypeaheadIndex":
+        index = cls()
+        names = db.query(models.Product.name, func.count(models.Product.id)).group_by(models.Product.name)
+        for name, count in names:
+            index.bulk_add(PRODUCT, name, count)
+        categories = db.query(models.Product.category, func.count(models.Product.id)).group_by(models.Product.category)
+        for category, count in categories:
+            index.bulk_add(CATEGORY, category, count)
+        businesses = (
+            db.query(models.Business.id, models.Business.business_name, func.count(models.Product.id))
+            .outerjoin(models.Product, models.Product.business_id == models.Business.id)
+            .group_by(models.Business.id)
+        )
+        for business_id, business_name, count in businesses:
+            index.business_keys[business_id] = index.bulk_add(BUSINESS, business_name, count, str(business_id))
+        index.finish_build()
+        return index
+
+    def bulk_add(self, kind: str, text: str, weight: int, ident: Optional[str] = None) -> str:
+        """
+        Add an entry without keeping the key list sorted; call finish_build() afterwards.
+        """
+        key = self._key(kind, text, ident)
+        if key not in self.entries:
+            self.keys.append(key)
+            self.entries[key] = [text, 0]
+        self.entries[key][1] += weight
+        return key
+
+    def finish_build(self):
+        self.keys.sort()
+        self.top_cache.clear()
+        self._warm("", 0, len(self.keys))
+
+    def _warm(self, prefix: str, low: int, high: int):
+        """
+        Cache the top keys of prefix and, recursively, of each longer prefix that
+        still matches more than SCAN_LIMIT keys.
+        """
+        if prefix:
+            self.top_cache[prefix] = heapq.nlargest(CACHE_SIZE, self.keys[low:high], key=self._weight)
+        depth = len(prefix)
+        position = low
+        while position < high:
+            key = self.keys[position]
+            # Keys that end at this prefix sort first, since SEPARATOR sorts lowest
+            if key[depth] == SEPARATOR:
+                position += 1
+                continue
+            child = key[:depth + 1]
+            child_high = bisect_left(self.keys, child + "\uffff", position, high)
+            if child_high - position > SCAN_LIMIT:
+                self._warm(child, position, child_high)
+            position = child_high
+
+    # -------------------- Updates --------------------
+    def adjust(self, kind: str, text: str, delta: int):
+        """
+        Change the weight of a product name or category, adding or removing it as needed.
+        """
+        key = self._key(kind, text)
+        entry = self.entries.get(key)
+        if entry is None:
+            if delta <= 0:
+                return
+            self._insert(key, text, delta)
+        elif entry[1] + delta <= 0:
+            self._remove(key)
+        else:
+            entry[1] += delta
+            self._weight_changed(key, delta)
+
+    def set_business(self, business_id: int, business_name: str, weight: Optional[int] = None):
+        """
+        Add or rename a business. The weight is kept unless one is given.
+        """
+        old_key = self.business_keys.get(business_id)
+        if weight is None:
+            weight = self.entries[old_key][1] if old_key else 0
+        if old_key is not None:
+            self._remove(old_key)
+        key = self._key(BUSINESS, business_name, str(business_id))
+        self.business_keys[business_id] = key
+        self._insert(key, business_name, weight)
+
+    def adjust_business(self, business_id: int, delta: int):
+        key = self.business_keys.get(business_id)
+        if key is not None:
+            self.entries[key][1] = max(0, self.entries[key][1] + delta)
+            self._weight_changed(key, delta)
+
+    def remove_business(self, business_id: int):
+        key = self.business_keys.pop(business_id, None)
+        if key is not None:
+            self._remove(key)
+
+    def apply_event(self, event: dict):
+        """
+        Apply a change feed event (see realtime.py) to the index.
+        """
+        op = event["op"]
+        if event["entity"] == BUSINESS:
+            name = (event.get("data") or event.get("changes") or {}).get("business_name")
+            if name is not None:
+                self.set_business(event["id"], name)
+            return
+
+        if op == "create":
+            self.adjust(PRODUCT, event["name"], 1)
+            self.adjust(CATEGORY, event["category"], 1)
+            self.adjust_business(event["business_id"], 1)
+        elif op == "delete":
+            self.adjust(PRODUCT, event["name"], -1)
+            self.adjust(CATEGORY, event["category"], -1)
+            self.adjust_business(event["business_id"], -1)
+        elif op == "update":
+            if "old_name" in event:
+                self.adjust(PRODUCT, event["old_name"], -1)
+                self.adjust(PRODUCT, event["name"], 1)
+            if "old_category" in event:
+                self.adjust(CATEGORY, event["old_category"], -1)
+                self.adjust(CATEGORY, event["category"], 1)
+
+    # -------------------- Queries --------------------
+    def search(self, prefix: str, limit: int = 10) -> List[dict]:
+        """
+        Return up to limit suggestions starting with prefix, highest weight first.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, CACHE_SIZE)
+
+        top = self.top_cache.get(prefix)
+        # A cached list shrinks as its keys are removed or lose weight; refill it when short
+        if top is None or len(top) < limit:
+            low, high = self._range(prefix)
+            if high - low <= SCAN_LIMIT:
+                top = heapq.nlargest(limit, self.keys[low:high], key=self._weight)
+            else:
+                top = heapq.nlargest(CACHE_SIZE, self.keys[low:high], key=self._weight)
+                self.top_cache[prefix] = top
+        return [self._suggestion(key) for key in top[:limit]]
+
+    # -------------------- Internals --------------------
+    @staticmethod
+    def _key(kind: str, text: str, ident: Optional[str] = None) -> str:
+        return SEPARATOR.join((normalize(text), kind, ident or ""))
+
+    def _weight(self, key: str) -> int:
+        return self.entries[key][1]
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\uffff")
+
+    def _suggestion(self, key: str) -> dict:
+        _, kind, ident = key.split(SEPARATOR)
+        text, weight = self.entries[key]
+        suggestion = {"text": text, "kind": kind, "weight": weight}
+        if kind == BUSINESS:
+            suggestion["id"] = int(ident)
+        return suggestion
+
+    def _cached_prefixes(self, key: str):
+        text = key.split(SEPARATOR, 1)[0]
+        for length in range(1, len(text) + 1):
+            prefix = text[:length]
+            if prefix in self.top_cache:
+                yield prefix
+
+    def _insert(self, key: str, text: str, weight: int):
+        insort(self.keys, key)
+        self.entries[key] = [text, weight]
+        self._weight_changed(key, weight)
+
+    def _remove(self, key: str):
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+        del self.entries[key]
+        for prefix in self._cached_prefixes(key):
+            top = self.top_cache[prefix]
+            if key in top:
+                top.remove(key)
+
+    def _weight_changed(self, key: str, delta: int):
+        # Each cached list holds the best keys of its prefix: every key outside it
+        # weighs no more than the lightest key in it. Updates keep that true.
+        weight = self._weight(key)
+        for prefix in self._cached_prefixes(key):
+            top = self.top_cache[prefix]
+            if key in top:
+                others = [self._weight(other) for other in top if other != key]
+                floor = min(others + [weight - delta])
+                if weight < floor:
+                    # A key outside the list may now outrank this one
+                    top.remove(key)
+                else:
+                    top.sort(key=self._weight, reverse=True)
+            elif top and weight > self._weight(top[-1]):
+                if len(top) >= CACHE_SIZE:
+                    top.pop()
+                top.append(key)
+                top.sort(key=self._weight, reverse=True)
+
+
+
+
+class LiveIndex:
+    """
+    The serving TypeaheadIndex, rebuilt from the database whenever the change feed
+    (re)connects and every typeahead_rebuild_seconds, so events missed while the
+    feed was down never leave it permanently out of date.
+
+    Events that arrive during a rebuild are applied to the old index and buffered,
+    then replayed onto the new one before it is swapped in. An event whose write the
+    rebuild already saw is applied twice; its small weight error lasts at most until
+    the next rebuild.
+    """
+
+    def __init__(self):
+        self.index = TypeaheadIndex()
+        self._pending: Optional[List[dict]] = None
+        self._lock = asyncio.Lock()
+
+    def search(self, prefix: str, limit: int = 10) -> List[dict]:
+        return self.index.search(prefix, limit)
+
+    def apply_event(self, event: dict):
+        if self._pending is not None:
+            self._pending.append(event)
+        self.index.apply_event(event)
+
+    async def rebuild(self):
+        async with self._lock:
+            self._pending = []
+            db = SessionLocal()
+            try:
+                built = await asyncio.to_thread(TypeaheadIndex.from_database, db)
+                for event in self._pending:
+                    built.apply_event(event)
+                self.index = built
+            except Exception as e:
+                print(f"Typeahead rebuild failed: {e}")
+            finally:
+                self._pending = None
+                db.close()
+
+    def schedule_rebuild(self):
+        asyncio.get_running_loop().create_task(self.rebuild())
+
+    async def rebuild_periodically(self):
+        while True:
+            await asyncio.sleep(settings.typeahead_rebuild_seconds)
+            await self.rebuild()
+
+
+
+index = LiveIndex()